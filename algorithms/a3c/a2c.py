@@ -0,0 +1,214 @@
+"""
+Synchronous variant (A2C) of the A3C training loop in train.py, run on either Atari or AI2ThorEnv.
+The asynchrony of A3C is not needed for its gradients, so instead of args.num_processes Hogwild
+workers each with their own model, a single learner owns the model and args.num_processes
+environments which are stepped in parallel worker processes (see SubprocVecEnv in envs.py).
+The workers write observations directly into a shared memory buffer with a slot per rollout step.
+Every step, the observations of all environments are stacked into one batch for a single forward
+pass under inference mode and the sampled actions are sent back to the workers. After
+args.num_steps, the model is rerun over the stored observations to get values, log probs and
+entropies for backprop. Returns and GAE are computed for all environments at once, and the shared
+model is optimised directly with a local Adam optimizer, so no gradient or state dict copying
+between processes is needed.
+With --cuda the learner runs on the GPU while the environments keep stepping on CPU, optionally
+with mixed precision forward passes (--amp).
+"""
+
+import contextlib
+import copy
+from functools import partial
+
+import torch
+import torch.optim as optim
+from torch.distributions import Categorical
+
+from gym_ai2thor.envs.ai2thor_env import AI2ThorEnv
+from algorithms.a3c.envs import create_atari_env, SubprocVecEnv
+from algorithms.a3c.model import compile_model, sample_action
+
+
+def make_env(args, rank):
+    if args.atari:
+        env = create_atari_env(args.atari_env_name)
+    else:
+        env = AI2ThorEnv(config_dict=args.config_dict)
+    env.seed(args.seed + rank)
+    return env
+
+
+def masked_returns_and_gae(rewards, masks, values, next_value, gamma, tau):
+    """
+    Computes bootstrapped discounted returns and Generalized Advantage Estimation for rewards,
+    masks and values of shape (num_steps, num_envs), with next_value of shape (num_envs,) being
+    the value of the observations after the last step. masks[i] is 0 for the environments whose
+    episode ended at step i, which cuts the recursion there. The loop is only over time, every
+    operation is vectorized over all environments.
+    """
+    value_targets = torch.cat([values, next_value.unsqueeze(0)])
+    R = next_value
+    gae = torch.zeros_like(next_value)
+    returns = torch.zeros_like(rewards)
+    advantages = torch.zeros_like(rewards)
+    for i in reversed(range(rewards.size(0))):
+        R = rewards[i] + gamma * R * masks[i]
+        returns[i] = R
+
+        delta_t = rewards[i] + gamma * value_targets[i + 1] * masks[i] - value_targets[i]
+        gae = delta_t + gamma * tau * masks[i] * gae
+        advantages[i] = gae
+    return returns, advantages
+
+
+def train_a2c(args, shared_model, counter):
+    torch.manual_seed(args.seed)
+
+    args.config_dict = {'max_episode_length': args.max_episode_length}
+    # Observations of step t of the rollout are written by the env workers into slot t of the
+    # shared buffer, so they stay valid until backprop without being copied or pickled
+    envs = SubprocVecEnv([partial(make_env, args, rank) for rank in range(args.num_processes)],
+                         num_slots=args.num_steps + 1, max_episode_length=args.max_episode_length)
+
+    device = torch.device('cuda' if args.cuda else 'cpu')
+    if args.cuda:
+        # Envs keep stepping on CPU in their workers while the learner trains its own copy on the
+        # GPU. Weights are copied back to the shared CPU model after every update for test()
+        model = copy.deepcopy(shared_model).to(device)
+        # page-locked staging buffer so the observation host to device copy is asynchronous
+        pinned_state = torch.empty(envs.obs_buffer.size()[1:]).pin_memory()
+    else:
+        # The learner updates the shared model in place so test() can keep syncing from it
+        model = shared_model
+    if args.compile:
+        model = compile_model(model)
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+    # With --amp the forward passes run in float16 and the loss is scaled to avoid gradient
+    # underflow. Autocast and the scaler are only created then, so they are not needed otherwise
+    if args.amp:
+        autocast = partial(torch.autocast, device_type=device.type, dtype=torch.float16)
+        scaler = torch.cuda.amp.GradScaler()
+    else:
+        autocast = contextlib.nullcontext
+        scaler = None
+
+    model.train()
+
+    envs.reset(slot=0)
+    if args.cuda:
+        # device copy of the observation slots, filled step by step while acting
+        states = torch.zeros(envs.obs_buffer.size(), device=device)
+    else:
+        states = envs.obs_buffer
+    cx = torch.zeros(envs.num_envs, 256, device=device)
+    hx = torch.zeros(envs.num_envs, 256, device=device)
+
+    # monitoring, reward so far of each env's current episode
+    episode_rewards = torch.zeros(envs.num_envs)
+    episode_total_rewards_sum = 0
+    num_episodes = 0
+
+    # rollout buffers, filled by step index
+    values = [None] * args.num_steps
+    logits = [None] * args.num_steps
+    actions = torch.zeros(args.num_steps, envs.num_envs, dtype=torch.long, device=device)
+    rewards = torch.zeros(args.num_steps, envs.num_envs, device=device)
+    masks = torch.zeros(args.num_steps, envs.num_envs, device=device)
+
+    while True:
+        # inference tensors can't be saved for backward, so the rerun starts from copies
+        hx_start, cx_start = hx.clone(), cx.clone()
+
+        for step in range(args.num_steps):
+            if args.cuda:
+                # staging buffer is free again, the previous copy finished before action.tolist()
+                pinned_state.copy_(envs.obs_buffer[step])
+                states[step].copy_(pinned_state, non_blocking=True)
+            # one forward pass for all envs, without a graph
+            with torch.inference_mode(), autocast():
+                _, logit, (hx, cx) = model((states[step], (hx, cx)))
+            action = sample_action(logit.float())
+            actions[step] = action
+
+            _, reward, done, _ = envs.step(action.tolist(), slot=step + 1)
+            reward = torch.from_numpy(reward)
+            # 0 for environments whose episode just ended (they were already reset by the worker)
+            mask = torch.from_numpy(1.0 - done.astype('float32'))
+
+            episode_rewards += reward
+            for env_idx in done.nonzero()[0]:
+                total_reward_for_episode = episode_rewards[env_idx].item()
+                episode_total_rewards_sum += total_reward_for_episode
+                num_episodes += 1
+                mean_episode_reward = episode_total_rewards_sum / num_episodes
+                print('Env {}. Episode Over. Total reward for episode: {}. '
+                      'Mean episode reward: {:.3f}'.format(env_idx, total_reward_for_episode,
+                                                           mean_episode_reward))
+            episode_rewards *= mask
+
+            rewards[step].copy_(reward)
+            masks[step].copy_(mask)
+            # Reset LSTM state of the environments that started a new episode
+            with torch.inference_mode():
+                hx = hx * masks[step].unsqueeze(1)
+                cx = cx * masks[step].unsqueeze(1)
+
+            counter.value += envs.num_envs
+
+        # No interaction with environment below.
+        if args.cuda:
+            states[args.num_steps].copy_(envs.obs_buffer[args.num_steps])
+
+        # Backprop and optimisation
+        # One conv call over all (num_steps + 1) * num_envs observations, the last slot giving the
+        # bootstrap values. The LSTM is stepped over time to reset the state of finished episodes
+        with autocast():
+            feats = model.conv_trunk(states.view((-1,) + states.size()[2:]))
+            feats = feats.view(args.num_steps + 1, envs.num_envs, -1)
+            learn_hx, learn_cx = hx_start, cx_start
+            for i in range(args.num_steps):
+                value, logit, (learn_hx, learn_cx) = model.head(feats[i:i + 1],
+                                                                (learn_hx, learn_cx))
+                # Policy and value outputs are kept in float32 for the distribution and GAE
+                values[i] = value.float().view(-1)
+                logits[i] = logit.float()[0]
+                learn_hx = learn_hx * masks[i].unsqueeze(1)
+                learn_cx = learn_cx * masks[i].unsqueeze(1)
+            next_value, _, _ = model.head(feats[args.num_steps:], (learn_hx, learn_cx))
+        next_value = next_value.float().view(-1).detach()
+
+        # (num_steps, num_envs) tensors
+        rollout_values = torch.stack(values)
+        dist = Categorical(logits=torch.stack(logits))
+        rollout_log_probs = dist.log_prob(actions)
+        rollout_entropies = dist.entropy()
+
+        returns, advantages = masked_returns_and_gae(rewards, masks, rollout_values.detach(),
+                                                     next_value, args.gamma, args.tau)
+
+        # Summed over time like each A3C worker, averaged over environments
+        value_loss = 0.5 * (returns - rollout_values).pow(2).sum() / envs.num_envs
+        policy_loss = (-(rollout_log_probs * advantages).sum() -
+                       args.entropy_coef * rollout_entropies.sum()) / envs.num_envs
+
+        optimizer.zero_grad()
+
+        loss = policy_loss + args.value_loss_coef * value_loss
+        if scaler is not None:
+            scaler.scale(loss).backward()
+            scaler.unscale_(optimizer)  # clip the true gradients, not the scaled ones
+            torch.nn.utils.clip_grad_norm_(model.parameters(), args.max_grad_norm)
+
+            scaler.step(optimizer)
+            scaler.update()
+        else:
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), args.max_grad_norm)
+
+            optimizer.step()
+
+        if args.cuda:
+            with torch.no_grad():
+                for param, shared_param in zip(model.parameters(), shared_model.parameters()):
+                    shared_param.copy_(param)
+
+        # Last observation of this rollout is the first of the next one
+        envs.obs_buffer[0].copy_(envs.obs_buffer[args.num_steps])
@@ -2,11 +2,14 @@
 Adapted from: https://github.com/ikostrikov/pytorch-a3c/blob/master/envs.py
 
 This contains auxiliary wrappers for the atari openAI gym environment e.g. proper resizing of the
-input frame and a running average normalisation of said frame after resizing
+input frame and a running average normalisation of said frame after resizing. It also contains
+SubprocVecEnv which steps a vector of environments in worker processes for the A2C learner.
 """
 import cv2
 import gym
 import numpy as np
+import torch
+import torch.multiprocessing as mp
 from gym.spaces.box import Box
 
 
@@ -60,3 +63,112 @@ class NormalizedEnv(gym.ObservationWrapper):
         unbiased_std = self.state_std / (1 - pow(self.alpha, self.num_steps))
 
         return (observation - unbiased_mean) / (unbiased_std + 1e-8)
+
+
+def _subproc_worker(remote, parent_remote, env_fn, rank, max_episode_length):
+    """
+    Owns a single environment and only steps it on the commands received through remote. Episodes
+    are reset automatically once done so the learner never has to wait on a separate reset call.
+    Observations are written straight into slot [slot, rank] of the shared observation buffer, so
+    only the slot index, reward and done flag go through the pipe.
+    """
+    parent_remote.close()
+    env = env_fn()
+    obs_buffer = None
+    episode_length = 0
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                action, slot = data
+                state, reward, done, info = env.step(action)
+                episode_length += 1
+                if max_episode_length and episode_length >= max_episode_length:
+                    done = True
+                if done:
+                    episode_length = 0
+                    state = env.reset()
+                obs_buffer[slot, rank].copy_(torch.from_numpy(state))
+                remote.send((reward, done, info))
+            elif cmd == 'reset':
+                episode_length = 0
+                obs_buffer[data, rank].copy_(torch.from_numpy(env.reset()))
+                remote.send(None)
+            elif cmd == 'get_observation_shape':
+                remote.send(env.observation_space.shape)
+            elif cmd == 'set_obs_buffer':
+                obs_buffer = data
+                remote.send(None)
+            elif cmd == 'close':
+                break
+            else:
+                raise NotImplementedError('Command: {} is not implemented'.format(cmd))
+    finally:
+        env.close()
+
+
+class SubprocVecEnv(object):
+    """
+    Adapted from: https://github.com/openai/baselines/blob/master/baselines/common/vec_env/subproc_vec_env.py
+
+    Runs each environment created by env_fns in its own process and steps all of them in parallel.
+    Workers only step their environment (no model), so the observations of all environments can be
+    stacked into a single batch for one policy forward pass.
+
+    Observations are not pickled through the pipes. Instead every worker writes them into
+    obs_buffer, a shared memory tensor of shape (num_slots, num_envs, *observation_shape), at the
+    slot given with each step/reset. step() and reset() return a view of that slot, so a learner
+    can keep num_slots observation batches alive (e.g. for backprop) without any copy.
+    """
+
+    def __init__(self, env_fns, num_slots=1, max_episode_length=None):
+        self.num_envs = len(env_fns)
+        self.remotes, self.work_remotes = zip(*[mp.Pipe() for _ in range(self.num_envs)])
+        self.processes = [mp.Process(target=_subproc_worker,
+                                     args=(work_remote, remote, env_fn, rank, max_episode_length))
+                          for rank, (work_remote, remote, env_fn) in
+                          enumerate(zip(self.work_remotes, self.remotes, env_fns))]
+        for p in self.processes:
+            p.daemon = True  # if the main process crashes, workers should not be left behind
+            p.start()
+        for work_remote in self.work_remotes:
+            work_remote.close()
+
+        self.remotes[0].send(('get_observation_shape', None))
+        observation_shape = tuple(self.remotes[0].recv())
+        # only the shared memory handle is sent to the workers, not the data
+        self.obs_buffer = torch.zeros((num_slots, self.num_envs) + observation_shape)
+        self.obs_buffer.share_memory_()
+        for remote in self.remotes:
+            remote.send(('set_obs_buffer', self.obs_buffer))
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting_slot = None
+
+    def reset(self, slot=0):
+        for remote in self.remotes:
+            remote.send(('reset', slot))
+        for remote in self.remotes:
+            remote.recv()
+        return self.obs_buffer[slot]
+
+    def step_async(self, actions, slot=0):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', (action, slot)))
+        self.waiting_slot = slot
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        rewards, dones, infos = zip(*results)
+        return self.obs_buffer[self.waiting_slot], np.array(rewards, dtype=np.float32), \
+            np.array(dones), infos
+
+    def step(self, actions, slot=0):
+        self.step_async(actions, slot)
+        return self.step_wait()
+
+    def close(self):
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for p in self.processes:
+            p.join()
@@ -7,6 +7,8 @@ Example of use:
 
 Runs A3C on our AI2ThorEnv wrapper with default params (4 processes). Optionally it can be
 run on any atari environment as well using the --atari and --atari-env-name params.
+With --a2c, the synchronous variant is run instead: 1 learner batching its forward passes over
+args.num_processes environment worker processes.
 """
 
 from __future__ import print_function
@@ -21,6 +23,7 @@ from gym_ai2thor.envs.ai2thor_env import AI2ThorEnv
 from algorithms.a3c.envs import create_atari_env
 from algorithms.a3c import my_optim
 from algorithms.a3c.model import ActorCritic
+from algorithms.a3c.a2c import train_a2c
 from algorithms.a3c.test import test
 from algorithms.a3c.train import train
 
@@ -48,6 +51,10 @@ parser.add_argument('--num-processes', type=int, default=4,
                     help='how many training processes to use (default: 1)')
 parser.add_argument('--num-steps', type=int, default=20,
                     help='number of forward steps in A3C (default: 20)')
+parser.add_argument('--accum-steps', type=int, default=1,
+                    help='number of rollouts to accumulate gradients over locally before each '
+                         'A3C update of the shared model. Each loss is divided by this number so '
+                         'the clipped gradient is their mean (default: 1)')
 parser.add_argument('--max-episode-length', type=int, default=1000,
                     help='maximum length of an episode (default: 1000000)')
 parser.add_argument('--no-shared', default=False,
@@ -58,6 +65,23 @@ parser.add_argument('-sync', '--synchronous', dest='synchronous', action='store_
                          '1 train() function is run and no test()')
 parser.add_argument('-async', '--asynchronous', dest='synchronous', action='store_false')
 parser.set_defaults(synchronous=False)
+parser.add_argument('--a2c', dest='a2c', action='store_true',
+                    help='Run synchronous A2C instead of A3C. A single learner batches the policy '
+                         'forward pass over args.num_processes env worker processes')
+parser.set_defaults(a2c=False)
+parser.add_argument('--cuda', dest='cuda', action='store_true',
+                    help='Run the A2C learner on the GPU. Only supported with --a2c since the '
+                         'Hogwild A3C workers share a CPU model')
+parser.set_defaults(cuda=False)
+parser.add_argument('--amp', dest='amp', action='store_true',
+                    help='Use mixed precision (float16) forward passes and loss scaling in the '
+                         'A2C learner. Requires --cuda')
+parser.set_defaults(amp=False)
+parser.add_argument('--compile', dest='compile', action='store_true',
+                    help='Compile the conv trunk of the model of each train process (or the A2C '
+                         'learner) with torch.compile to reduce per step overhead. '
+                         'Requires PyTorch 2.0+')
+parser.set_defaults(compile=False)
 
 # Atari arguments. Good example of keeping code modular and allowing algorithms to run everywhere
 parser.add_argument('--atari', dest='atari', action='store_true',
@@ -72,25 +96,35 @@ parser.set_defaults(atari_render=False)
 
 
 if __name__ == '__main__':
-    os.environ['OMP_NUM_THREADS'] = '1'
-    os.environ['CUDA_VISIBLE_DEVICES'] = ""
-
     args = parser.parse_args()
 
+    os.environ['OMP_NUM_THREADS'] = '1'
+    if args.cuda and not args.a2c:
+        raise ValueError('--cuda is only supported together with --a2c')
+    if args.amp and not args.cuda:
+        raise ValueError('--amp requires --cuda')
+    if args.accum_steps < 1:
+        raise ValueError('--accum-steps must be at least 1')
+    if args.accum_steps > 1 and args.a2c:
+        raise ValueError('--accum-steps is only supported by A3C, not --a2c')
+    if not args.cuda:
+        os.environ['CUDA_VISIBLE_DEVICES'] = ""
+
     torch.manual_seed(args.seed)
     if args.atari:
         env = create_atari_env(args.atari_env_name)
+        observation_space, action_space = env.observation_space, env.action_space
+        env.close()  # above env initialisation was only to find certain params needed
         args.frame_dim = 42  # fixed to be 42x42 in envs.py _process_frame42()
     else:
         args.config_dict = {'max_episode_length': args.max_episode_length}
-        env = AI2ThorEnv(config_dict=args.config_dict)
-        args.frame_dim = env.config['resolution'][-1]
-    shared_model = ActorCritic(env.observation_space.shape[0], env.action_space.n, args.frame_dim)
+        # read from the config so ai2thor doesn't have to be started just to find these
+        observation_space, action_space = AI2ThorEnv.get_spaces(config_dict=args.config_dict)
+        args.frame_dim = observation_space.shape[-1]
+    shared_model = ActorCritic(observation_space.shape[0], action_space.n, args.frame_dim)
     shared_model.share_memory()
 
-    env.close()  # above env initialisation was only to find certain params needed
-
-    if args.no_shared:
+    if args.no_shared or args.a2c:
         optimizer = None
     else:
         optimizer = my_optim.SharedAdam(shared_model.parameters(), lr=args.lr)
@@ -99,16 +133,22 @@ if __name__ == '__main__':
     processes = []
 
     counter = mp.Value('i', 0)
-    lock = mp.Lock()
 
-    if not args.synchronous:
+    if args.a2c:
+        if not args.synchronous:
+            p = mp.Process(target=test, args=(args.num_processes, args, shared_model, counter))
+            p.start()
+            processes.append(p)
+        # learner runs on main process and steps envs in args.num_processes worker processes
+        train_a2c(args, shared_model, counter)
+    elif not args.synchronous:
         # test runs continuously and if episode ends, sleeps for args.test_sleep_time seconds
         p = mp.Process(target=test, args=(args.num_processes, args, shared_model, counter))
         p.start()
         processes.append(p)
 
         for rank in range(0, args.num_processes):
-            p = mp.Process(target=train, args=(rank, args, shared_model, counter, lock, optimizer))
+            p = mp.Process(target=train, args=(rank, args, shared_model, counter, optimizer))
             p.start()
             processes.append(p)
         for p in processes:
@@ -116,4 +156,4 @@ if __name__ == '__main__':
     else:
         rank = 0
         # test(args.num_processes, args, shared_model, counter)  # for checking test functionality
-        train(rank, args, shared_model, counter, lock, optimizer)  # run train on main thread
+        train(rank, args, shared_model, counter, optimizer)  # run train on main thread
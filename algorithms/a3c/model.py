@@ -58,6 +58,32 @@ def weights_init(m):
         m.bias.data.fill_(0)
 
 
+def compile_model(model):
+    """
+    Compiles conv_trunk of an ActorCritic (and therefore that part of forward too) with
+    torch.compile, fusing the conv and elu ops of every acting step and of the batched rerun. It is
+    compiled on its own because the training loops call it directly rather than forward.
+    The head is left eager: Dynamo does not trace nn.LSTM by default and would fall back to eager
+    for it anyway, and the linear layers around it are too small to gain from fusion.
+    CUDA graphs (mode='reduce-overhead') are not used since the training loops keep the outputs of
+    several calls alive until backprop, which graph replays would overwrite.
+    """
+    if not hasattr(torch, 'compile'):
+        raise RuntimeError('Compiling the model requires PyTorch 2.0 or newer')
+    model.conv_trunk = torch.compile(model.conv_trunk)
+    return model
+
+
+def sample_action(logits):
+    """
+    Samples one action per row of (unnormalised) logits with the Gumbel-max trick, i.e.
+    argmax(logits + Gumbel noise), which avoids the softmax and multinomial calls of
+    Categorical(logits=logits).sample() on the acting hot path.
+    """
+    gumbel_noise = -torch.empty_like(logits).exponential_().log()
+    return (logits + gumbel_noise).argmax(dim=-1)
+
+
 class ActorCritic(torch.nn.Module):
     """
     Mainly Ikostrikov's implementation of A3C (https://arxiv.org/abs/1602.01783).
@@ -67,6 +93,10 @@ class ActorCritic(torch.nn.Module):
     and passed to an LSTM (with previous or initial hidden and cell states (hx and cx)).
     The new hidden state is used as an input to the critic and value nn.Linear layer heads,
     The final output is then predicted value, action logits, hx and cx.
+
+    The conv layers (conv_trunk) and the LSTM and linear layers (head) can also be called
+    separately so that conv features cached while acting one step at a time can be passed through
+    the head as a whole sequence in one call when learning.
     """
 
     def __init__(self, num_input_channels, num_outputs, frame_dim):
@@ -79,7 +109,7 @@ class ActorCritic(torch.nn.Module):
         # assumes square image
         self.lstm_cell_size = calculate_lstm_input_size_after_4_conv_layers(frame_dim)
 
-        self.lstm = nn.LSTMCell(self.lstm_cell_size, 256)  # for 128x128 input
+        self.lstm = nn.LSTM(self.lstm_cell_size, 256)  # for 128x128 input
 
         self.critic_linear = nn.Linear(256, 1)
         self.actor_linear = nn.Linear(256, num_outputs)
@@ -92,13 +122,15 @@ class ActorCritic(torch.nn.Module):
                                             self.critic_linear.weight.data, 1.0)
         self.critic_linear.bias.data.fill_(0)
 
-        self.lstm.bias_ih.data.fill_(0)
-        self.lstm.bias_hh.data.fill_(0)
+        self.lstm.bias_ih_l0.data.fill_(0)
+        self.lstm.bias_hh_l0.data.fill_(0)
 
         self.train()
 
-    def forward(self, inputs):
-        inputs, (hx, cx) = inputs
+    def conv_trunk(self, inputs):
+        """
+        Returns flattened conv features of shape (batch, lstm_cell_size) for a batch of images
+        """
         if len(inputs.size()) == 3:  # if batch forgotten
             inputs = inputs.unsqueeze(0)
         x = F.elu(self.conv1(inputs))
@@ -106,8 +138,22 @@ class ActorCritic(torch.nn.Module):
         x = F.elu(self.conv3(x))
         x = F.elu(self.conv4(x))
 
-        x = x.view(-1, self.lstm_cell_size)
-        hx, cx = self.lstm(x, (hx, cx))
-        x = hx
+        return x.view(-1, self.lstm_cell_size)
+
+    def head(self, feats, hidden):
+        """
+        Runs the LSTM over a sequence of conv features of shape (seq_len, batch, lstm_cell_size)
+        starting from hidden = (hx, cx), each of shape (batch, 256). Returns values and action
+        logits for every step in the sequence and the final (hx, cx).
+        """
+        hx, cx = hidden
+        x, (hx, cx) = self.lstm(feats, (hx.unsqueeze(0), cx.unsqueeze(0)))
+
+        return self.critic_linear(x), self.actor_linear(x), (hx.squeeze(0), cx.squeeze(0))
+
+    def forward(self, inputs):
+        inputs, (hx, cx) = inputs
+        x = self.conv_trunk(inputs)
+        values, logits, (hx, cx) = self.head(x.unsqueeze(0), (hx, cx))
 
-        return self.critic_linear(x), self.actor_linear(x), (hx, cx)
+        return values[0], logits[0], (hx, cx)
@@ -57,15 +57,15 @@ def test(rank, args, shared_model, counter):
         with torch.no_grad():
             value, logit, (hx, cx) = model((state.unsqueeze(0).float(), (hx, cx)))
         prob = F.softmax(logit, dim=-1)
-        action = prob.max(1, keepdim=True)[1].numpy()
+        action = prob.argmax(dim=-1).item()
 
-        state, reward, done, _ = env.step(action[0, 0])
+        state, reward, done, _ = env.step(action)
         done = done or episode_length >= args.max_episode_length
         reward_sum += reward
 
         # a quick hack to prevent the agent from stucking
         # i.e. in test mode an agent can repeat an action ad infinitum
-        actions.append(action[0, 0])
+        actions.append(action)
         if actions.count(actions[0]) == actions.maxlen:
             print('In test. Episode over because agent repeated action {} times'.format(
                                                                                 actions.maxlen))
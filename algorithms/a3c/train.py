@@ -5,32 +5,57 @@ Contains the train code run by each A3C process on either Atari or AI2ThorEnv.
 For initialisation, we set up the environment, seeds, shared model and optimizer.
 In the main training loop, we always ensure the weights of the current model are equal to the
 shared model. Then the algorithm interacts with the environment args.num_steps at a time,
-i.e it sends an action to the env for each state and stores predicted values, rewards, log probs
-and entropies to be used for loss calculation and backpropagation.
+i.e it sends an action to the env for each state and stores states, actions and rewards. Acting
+runs under inference mode, and the model is then rerun over all stored states in one batched call
+to get the predicted values, log probs and entropies to be used for loss calculation and
+backpropagation.
 After args.num_steps has passed, we calculate advantages, value losses and policy losses using
 Generalized Advantage Estimation (GAE) with the entropy loss added onto policy loss to encourage
 exploration. Once these losses have been calculated, we add them all together, backprop to find all
 gradients and then optimise with Adam and we go back to the start of the main training loop.
+With args.accum_steps > 1, gradients of that many rollouts are accumulated locally before a single
+optimisation step of the shared model.
 """
 
 import torch
-import torch.nn.functional as F
 import torch.optim as optim
+from torch.distributions import Categorical
 
 from gym_ai2thor.envs.ai2thor_env import AI2ThorEnv
 from algorithms.a3c.envs import create_atari_env
-from algorithms.a3c.model import ActorCritic
-
-
-def ensure_shared_grads(model, shared_model):
-    for param, shared_param in zip(model.parameters(),
-                                   shared_model.parameters()):
-        if shared_param.grad is not None:
-            return
-        shared_param._grad = param.grad
-
-
-def train(rank, args, shared_model, counter, lock, optimizer=None):
+from algorithms.a3c.model import ActorCritic, compile_model, sample_action
+
+
+def share_flat_grads(model, shared_model):
+    """
+    Makes the gradients of all local parameters views into a single flat buffer and points the
+    .grad of each shared parameter (an attribute local to this process) at the same view, so the
+    shared optimizer reads the local gradients directly. Returns the flat buffer, which is zeroed
+    in one call after each optimizer step.
+    """
+    params = list(model.parameters())
+    flat_grads = torch.zeros(sum(param.numel() for param in params))
+    offset = 0
+    for param, shared_param in zip(params, shared_model.parameters()):
+        param.grad = flat_grads[offset:offset + param.numel()].view_as(param)
+        shared_param.grad = param.grad
+        offset += param.numel()
+    return flat_grads
+
+
+def discounted_cumsum(x, discount):
+    """
+    Computes y[t] = sum_k discount^k * x[t + k] over a 1D tensor as a single matrix-vector product.
+    Row t of the upper triangular weight matrix holds discount^(k - t) for every k >= t.
+    """
+    length = x.size(0)
+    steps = torch.arange(length, dtype=x.dtype)
+    exponents = steps.unsqueeze(0) - steps.unsqueeze(1)
+    weights = torch.triu(torch.pow(discount, exponents.clamp(min=0)))
+    return weights.mv(x)
+
+
+def train(rank, args, shared_model, counter, optimizer=None):
     torch.manual_seed(args.seed + rank)
 
     if args.atari:
@@ -41,113 +66,134 @@ def train(rank, args, shared_model, counter, lock, optimizer=None):
     env.seed(args.seed + rank)
 
     model = ActorCritic(env.observation_space.shape[0], env.action_space.n, args.frame_dim)
+    if args.compile:
+        model = compile_model(model)
 
     if optimizer is None:
         optimizer = optim.Adam(shared_model.parameters(), lr=args.lr)
 
     model.train()
 
+    flat_grads = share_flat_grads(model, shared_model)
+
+    # Parameters and buffers are copied in place from the shared model at the start of a rollout
+    local_tensors = list(model.parameters()) + list(model.buffers())
+    shared_tensors = list(shared_model.parameters()) + list(shared_model.buffers())
+
     state = env.reset()
     state = torch.from_numpy(state)
     done = True
 
     # monitoring
-    total_reward_for_num_steps_list = []
-    episode_total_rewards_list = []
-    all_rewards_in_episode = []
-    avg_reward_for_num_steps_list = []
+    episode_total_rewards_sum = 0
+    num_episodes = 0
+    episode_reward = 0
+
+    # rollout buffers. states has an extra slot for the state after the last step
+    states = torch.zeros((args.num_steps + 1,) + env.observation_space.shape)
+    actions = torch.zeros(args.num_steps, 1, dtype=torch.long)
+    rewards = torch.zeros(args.num_steps)
 
     total_length = 0
     episode_length = 0
+    num_rollouts = 0
     while True:
-        # Sync with the shared model
-        model.load_state_dict(shared_model.state_dict())
+        # Sync with the shared model. Only done at the start of each args.accum_steps rollouts so
+        # that all gradients accumulated before the next optimizer step use the same weights
+        if num_rollouts % args.accum_steps == 0:
+            with torch.no_grad():
+                for local_tensor, shared_tensor in zip(local_tensors, shared_tensors):
+                    local_tensor.copy_(shared_tensor)
         if done:
             cx = torch.zeros(1, 256)
             hx = torch.zeros(1, 256)
         else:
-            cx = cx.detach()
-            hx = hx.detach()
-
-        values = []
-        log_probs = []
-        rewards = []
-        entropies = []
+            # clone so the rerun below can backprop through the LSTM state from acting
+            cx = cx.clone()
+            hx = hx.clone()
+        # LSTM state at the start of the rollout, to rerun the whole sequence through the model
+        hx_start, cx_start = hx, cx
 
         for step in range(args.num_steps):
             episode_length += 1
             total_length += 1
-            value, logit, (hx, cx) = model((state.unsqueeze(0).float(), (hx, cx)))
-            prob = F.softmax(logit, dim=-1)
-            log_prob = F.log_softmax(logit, dim=-1)
-            entropy = -(log_prob * prob).sum(1, keepdim=True)
-            entropies.append(entropy)
+            # act without building a graph
+            with torch.inference_mode():
+                _, logit, (hx, cx) = model((state.unsqueeze(0).float(), (hx, cx)))
+            action = sample_action(logit)
+            states[step].copy_(state)
 
-            action = prob.multinomial(num_samples=1).detach()
-            log_prob = log_prob.gather(1, action)
-
-            action_int = action.numpy()[0][0].item()
-            state, reward, done, _ = env.step(action_int)
+            state, reward, done, _ = env.step(action.item())
 
             done = done or episode_length >= args.max_episode_length
-
-            with lock:
-                counter.value += 1
+            episode_reward += reward
 
             if done:
                 episode_length = 0
                 total_length -= 1
-                total_reward_for_episode = sum(all_rewards_in_episode)
-                episode_total_rewards_list.append(total_reward_for_episode)
-                all_rewards_in_episode = []
+                total_reward_for_episode = episode_reward
+                episode_total_rewards_sum += total_reward_for_episode
+                num_episodes += 1
+                episode_reward = 0
                 state = env.reset()
-                print('Episode Over. Total Length: {}. Total reward for episode: {}'.format(
-                                            total_length,  total_reward_for_episode))
+                mean_episode_reward = episode_total_rewards_sum / num_episodes
+                print('Episode Over. Total Length: {}. Total reward for episode: {}. '
+                      'Mean episode reward: {:.3f}'.format(total_length, total_reward_for_episode,
+                                                           mean_episode_reward))
                 print('Step no: {}. total length: {}'.format(episode_length, total_length))
 
             state = torch.from_numpy(state)
-            values.append(value)
-            log_probs.append(log_prob)
-            rewards.append(reward)
-            all_rewards_in_episode.append(reward)
+            actions[step] = action
+            rewards[step] = reward
 
             if done:
                 break
+        num_steps = step + 1
 
         # No interaction with environment below.
-        # Monitoring
-        total_reward_for_num_steps = sum(rewards)
-        total_reward_for_num_steps_list.append(total_reward_for_num_steps)
-        avg_reward_for_num_steps = total_reward_for_num_steps / len(rewards)
-        avg_reward_for_num_steps_list.append(avg_reward_for_num_steps)
+        # Monitoring. The shared step counter is updated once per rollout
+        with counter.get_lock():
+            counter.value += num_steps
 
         # Backprop and optimisation
-        R = torch.zeros(1, 1)
+        # Rerun the rollout with one batched conv call and one (seq_len, 1) LSTM call. If the
+        # episode hasn't ended, the state after the last step is included for the bootstrap value
+        num_states = num_steps
         if not done:  # to change last reward to predicted value to ....
-            value, _, _ = model((state.unsqueeze(0).float(), (hx, cx)))
-            R = value.detach()
+            states[num_steps].copy_(state)
+            num_states += 1
+        feats = model.conv_trunk(states[:num_states])
+        values, logits, _ = model.head(feats.unsqueeze(1), (hx_start, cx_start))
+        values = values.view(-1)
+        R = values[num_steps:].detach() if not done else torch.zeros(1)
+        dist = Categorical(logits=logits[:num_steps])
+        entropies = dist.entropy().view(-1)
+        log_probs = dist.log_prob(actions[:num_steps]).view(-1)
+
+        # Stack rollout into contiguous tensors so returns, GAE and losses are single reductions
+        values = torch.cat([values[:num_steps], R])
+        rollout_rewards = rewards[:num_steps]
 
-        values.append(R)
-        policy_loss = 0
-        value_loss = 0
         # import pdb;pdb.set_trace() # good place to breakpoint to see training cycle
-        gae = torch.zeros(1, 1)
-        for i in reversed(range(len(rewards))):
-            R = args.gamma * R + rewards[i]
-            advantage = R - values[i]
-            value_loss = value_loss + 0.5 * advantage.pow(2)
-
-            # Generalized Advantage Estimation
-            delta_t = rewards[i] + args.gamma * values[i + 1] - values[i]
-            gae = gae * args.gamma * args.tau + delta_t
-
-            policy_loss = policy_loss - log_probs[i] * gae.detach() - \
-                          args.entropy_coef * entropies[i]
-
-        optimizer.zero_grad()
-
-        (policy_loss + args.value_loss_coef * value_loss).backward()
-        torch.nn.utils.clip_grad_norm_(model.parameters(), args.max_grad_norm)
-
-        ensure_shared_grads(model, shared_model)
-        optimizer.step()
+        # Bootstrapped discounted returns, with R discounted in as the last reward
+        returns = discounted_cumsum(torch.cat([rollout_rewards, values[-1:].detach()]),
+                                    args.gamma)[:-1]
+        advantages = returns - values[:-1]
+        value_loss = 0.5 * advantages.pow(2).sum()
+
+        # Generalized Advantage Estimation
+        deltas = rollout_rewards + args.gamma * values[1:].detach() - values[:-1].detach()
+        gae = discounted_cumsum(deltas, args.gamma * args.tau)
+
+        policy_loss = -(log_probs * gae).sum() - args.entropy_coef * entropies.sum()
+
+        # backward accumulates in place into the flat buffer shared with the optimizer's params.
+        # The shared model is only stepped once every args.accum_steps rollouts, with the loss
+        # scaled so the clipped gradient is the mean over those rollouts
+        ((policy_loss + args.value_loss_coef * value_loss) / args.accum_steps).backward()
+        num_rollouts += 1
+
+        if num_rollouts % args.accum_steps == 0:
+            torch.nn.utils.clip_grad_norm_(model.parameters(), args.max_grad_norm)
+            optimizer.step()
+            flat_grads.zero_()
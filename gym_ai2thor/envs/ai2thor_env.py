@@ -39,6 +39,32 @@ ALL_POSSIBLE_ACTIONS = [
 ]
 
 
+def get_action_names(config):
+    """
+    Returns the tuple of action names available with this config. Open/close and pickup/put
+    actions are removed if their respective interaction bool is set to False
+    """
+    action_names = tuple(ALL_POSSIBLE_ACTIONS.copy())
+    if not config['open_close_interaction']:
+        # Don't allow opening and closing if set to False
+        action_names = tuple([action_name for action_name in action_names if 'Open'
+                              not in action_name and 'Close' not in action_name])
+    if not config['pickup_put_interaction']:
+        action_names = tuple([action_name for action_name in action_names if 'Pickup'
+                              not in action_name and 'Put' not in action_name])
+    return action_names
+
+
+def get_observation_space(config):
+    """
+    Returns the (channels, height, width) image observation space for this config
+    """
+    channels = 1 if config['grayscale'] else 3
+    return spaces.Box(low=0, high=255,
+                      shape=(channels, config['resolution'][0], config['resolution'][1]),
+                      dtype=np.uint8)
+
+
 class AI2ThorEnv(gym.Env):
     """
     Wrapper base class
@@ -65,15 +91,7 @@ class AI2ThorEnv(gym.Env):
                             'receptacles': self.config['acceptable_receptacles'],
                             'openables':   self.config['openable_objects']}
         # Action settings
-        self.action_names = tuple(ALL_POSSIBLE_ACTIONS.copy())
-        # remove open/close and pickup/put actions if respective interaction bool is set to False
-        if not self.config['open_close_interaction']:
-            # Don't allow opening and closing if set to False
-            self.action_names = tuple([action_name for action_name in self.action_names if 'Open'
-                                       not in action_name and 'Close' not in action_name])
-        if not self.config['pickup_put_interaction']:
-            self.action_names = tuple([action_name for action_name in self.action_names if 'Pickup'
-                                       not in action_name and 'Put' not in action_name])
+        self.action_names = get_action_names(self.config)
         self.action_space = spaces.Discrete(len(self.action_names))
         # rotation settings
         self.continuous_movement = self.config.get('continuous_movement', False)
@@ -83,11 +101,7 @@ class AI2ThorEnv(gym.Env):
 
         # Image settings
         self.event = None
-        channels = 1 if self.config['grayscale'] else 3
-        self.observation_space = spaces.Box(low=0, high=255,
-                                            shape=(channels, self.config['resolution'][0],
-                                                   self.config['resolution'][1]),
-                                            dtype=np.uint8)
+        self.observation_space = get_observation_space(self.config)
         # ai2thor initialise function settings
         self.metadata_last_object_attributes = ['lastObjectPut', 'lastObjectPutReceptacle',
                                                 'lastObjectPickedUp', 'lastObjectOpened',
@@ -118,6 +132,19 @@ class AI2ThorEnv(gym.Env):
 
         self.controller.start()
 
+    @staticmethod
+    def get_spaces(config_file='config_files/config_example.json', config_dict=None):
+        """
+        Returns the observation and action spaces an environment with this configuration would
+        have, without starting ai2thor. Useful for building models before (or without) paying the
+        Unity start up cost of creating an environment.
+        :param config_file:  (str)   Path to environment configuration file, as in __init__
+        :param: config_dict: (dict)  Overrides specific fields from the input configuration file.
+        :return: (tuple) (observation_space, action_space)
+        """
+        config = read_config(config_file, config_dict)
+        return get_observation_space(config), spaces.Discrete(len(get_action_names(config)))
+
     def step(self, action, verbose=True):
         if not self.action_space.contains(action):
             raise error.InvalidAction('Action must be an integer between '
@@ -0,0 +1,104 @@
+"""
+Tests for SubprocVecEnv, run on CPU with a small deterministic fake environment.
+"""
+from functools import partial
+import unittest
+
+import gym
+import numpy as np
+import torch
+from gym.spaces.box import Box
+
+from algorithms.a3c.envs import SubprocVecEnv
+
+
+class CountingEnv(gym.Env):
+    """
+    Deterministic environment whose observations are filled with
+    rank * 1000 + number of resets * 100 + steps taken in the episode, so the env, episode and step
+    of each observation can be read back from its value. The reward of every step is
+    rank * 10 + action and episodes are done after done_after steps.
+    """
+    observation_space = Box(0.0, 10000.0, [1, 2, 2])
+
+    def __init__(self, rank, done_after):
+        self.rank = rank
+        self.done_after = done_after
+        self.num_resets = 0
+        self.t = 0
+
+    def _make_observation(self):
+        value = self.rank * 1000 + self.num_resets * 100 + self.t
+        return np.full(self.observation_space.shape, value, dtype=np.float32)
+
+    def reset(self):
+        self.num_resets += 1
+        self.t = 0
+        return self._make_observation()
+
+    def step(self, action):
+        self.t += 1
+        return self._make_observation(), float(self.rank * 10 + action), \
+            self.t >= self.done_after, {}
+
+    def close(self):
+        pass
+
+
+class TestSubprocVecEnv(unittest.TestCase):
+    """
+    Env 0 ends its episodes itself after 3 steps while env 1 is cut off by max_episode_length=4
+    """
+    num_steps = 6
+    # observation values written for steps 1..num_steps, i.e. after an automatic reset on done
+    expected_obs_values = [[101, 1101], [102, 1102], [200, 1103], [201, 1200], [202, 1201],
+                           [300, 1202]]
+    expected_dones = [[False, False], [False, False], [True, False], [False, True],
+                      [False, False], [True, False]]
+
+    def setUp(self):
+        env_fns = [partial(CountingEnv, 0, done_after=3), partial(CountingEnv, 1, done_after=100)]
+        self.envs = SubprocVecEnv(env_fns, num_slots=self.num_steps + 1, max_episode_length=4)
+
+    def tearDown(self):
+        self.envs.close()
+
+    def assert_obs_values(self, obs, values):
+        expected = torch.tensor(values, dtype=torch.float32).view(-1, 1, 1, 1).expand_as(obs)
+        self.assertTrue(torch.equal(obs, expected))
+
+    def test_reset_step_and_auto_reset(self):
+        self.assertEqual(self.envs.obs_buffer.size(), (self.num_steps + 1, 2, 1, 2, 2))
+        obs = self.envs.reset(slot=0)
+        self.assert_obs_values(obs, [100, 1100])
+
+        for step in range(self.num_steps):
+            actions = [step, step]
+            if step % 2 == 0:
+                obs, rewards, dones, _ = self.envs.step(actions, slot=step + 1)
+            else:
+                self.envs.step_async(actions, slot=step + 1)
+                obs, rewards, dones, _ = self.envs.step_wait()
+
+            self.assert_obs_values(obs, self.expected_obs_values[step])
+            np.testing.assert_array_equal(rewards, np.array([step, 10 + step], dtype=np.float32))
+            np.testing.assert_array_equal(dones, self.expected_dones[step])
+
+    def test_obs_buffer_slots(self):
+        """
+        Each step writes every env's observation (the reset observation if its episode ended)
+        into obs_buffer[slot, rank] and leaves all earlier slots untouched
+        """
+        self.envs.reset(slot=0)
+        obs_values_per_slot = [[100, 1100]] + self.expected_obs_values
+        for step in range(self.num_steps):
+            self.envs.step([0, 0], slot=step + 1)
+            for slot in range(step + 2):
+                for rank in range(self.envs.num_envs):
+                    expected = torch.full((1, 2, 2), float(obs_values_per_slot[slot][rank]))
+                    self.assertTrue(torch.equal(self.envs.obs_buffer[slot, rank], expected),
+                                    'slot {}, rank {} after step {}'.format(slot, rank, step))
+
+
+if __name__ == '__main__':
+    unittest.main()
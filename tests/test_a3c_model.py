@@ -0,0 +1,46 @@
+"""
+Tests for the A3C ActorCritic model.
+"""
+import unittest
+
+import torch
+
+from algorithms.a3c.model import ActorCritic
+
+
+class TestActorCritic(unittest.TestCase):
+    """
+    Checks that stepping the model one observation at a time and rerunning the whole sequence
+    through conv_trunk and head in one call give the same outputs
+    """
+    def test_forward_steps_match_batched_head(self):
+        torch.manual_seed(0)
+        seq_len, num_actions = 5, 4
+        model = ActorCritic(3, num_actions, frame_dim=42)
+        inputs = torch.randn(seq_len, 3, 42, 42)
+        hx_start, cx_start = torch.randn(1, 256), torch.randn(1, 256)
+
+        with torch.no_grad():
+            hx, cx = hx_start, cx_start
+            step_values, step_logits = [], []
+            for t in range(seq_len):
+                value, logit, (hx, cx) = model((inputs[t:t + 1], (hx, cx)))
+                step_values.append(value)
+                step_logits.append(logit)
+
+            feats = model.conv_trunk(inputs)
+            values, logits, (batched_hx, batched_cx) = model.head(feats.unsqueeze(1),
+                                                                  (hx_start, cx_start))
+
+        self.assertEqual(values.size(), (seq_len, 1, 1))
+        self.assertEqual(logits.size(), (seq_len, 1, num_actions))
+        self.assertTrue(torch.allclose(values.view(-1), torch.cat(step_values).view(-1),
+                                       atol=1e-5))
+        self.assertTrue(torch.allclose(logits.view(seq_len, -1), torch.cat(step_logits),
+                                       atol=1e-5))
+        self.assertTrue(torch.allclose(batched_hx, hx, atol=1e-5))
+        self.assertTrue(torch.allclose(batched_cx, cx, atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
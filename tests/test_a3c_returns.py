@@ -0,0 +1,113 @@
+"""
+Tests the vectorised returns and GAE of the A3C and A2C train loops against plain reversed loops.
+"""
+import unittest
+
+import torch
+
+from algorithms.a3c.a2c import masked_returns_and_gae
+from algorithms.a3c.train import discounted_cumsum
+
+
+def reversed_loop_returns_and_gae(rewards, values, gamma, tau):
+    """
+    Original per-step computation from the A3C train loop. values holds one more entry than
+    rewards, the last one being the bootstrap value R.
+    """
+    R = values[-1].item()
+    gae = 0.
+    returns = [0.] * len(rewards)
+    gaes = [0.] * len(rewards)
+    for i in reversed(range(len(rewards))):
+        R = gamma * R + rewards[i].item()
+        returns[i] = R
+        delta_t = rewards[i].item() + gamma * values[i + 1].item() - values[i].item()
+        gae = gae * gamma * tau + delta_t
+        gaes[i] = gae
+    return torch.tensor(returns, dtype=torch.float64), torch.tensor(gaes, dtype=torch.float64)
+
+
+def per_env_loop_returns_and_gae(rewards, masks, values, next_value, gamma, tau):
+    """
+    Returns and GAE computed separately for each environment, restarting the recursion from zero
+    at every step where an episode ended
+    """
+    num_steps, num_envs = rewards.size()
+    returns = torch.zeros(num_steps, num_envs, dtype=torch.float64)
+    gaes = torch.zeros(num_steps, num_envs, dtype=torch.float64)
+    for env_idx in range(num_envs):
+        R = next_value[env_idx].item()
+        next_step_value = next_value[env_idx].item()
+        gae = 0.
+        for i in reversed(range(num_steps)):
+            if masks[i, env_idx] == 0:  # the episode ended at step i, nothing to bootstrap from
+                R, next_step_value, gae = 0., 0., 0.
+            R = gamma * R + rewards[i, env_idx].item()
+            returns[i, env_idx] = R
+            delta_t = rewards[i, env_idx].item() + gamma * next_step_value - \
+                values[i, env_idx].item()
+            gae = gae * gamma * tau + delta_t
+            gaes[i, env_idx] = gae
+            next_step_value = values[i, env_idx].item()
+    return returns, gaes
+
+
+class TestDiscountedCumsum(unittest.TestCase):
+    """
+    Compares discounted_cumsum based returns and GAE to the reversed loop they replaced
+    """
+    def check_against_loop(self, num_steps, gamma, tau):
+        torch.manual_seed(num_steps)
+        rewards = torch.randn(num_steps, dtype=torch.float64)
+        values = torch.randn(num_steps + 1, dtype=torch.float64)
+
+        returns = discounted_cumsum(torch.cat([rewards, values[-1:]]), gamma)[:-1]
+        deltas = rewards + gamma * values[1:] - values[:-1]
+        gae = discounted_cumsum(deltas, gamma * tau)
+
+        expected_returns, expected_gae = reversed_loop_returns_and_gae(rewards, values, gamma, tau)
+        self.assertTrue(torch.allclose(returns, expected_returns))
+        self.assertTrue(torch.allclose(gae, expected_gae))
+
+    def test_random_rollout(self):
+        self.check_against_loop(num_steps=20, gamma=0.99, tau=1.00)
+        self.check_against_loop(num_steps=20, gamma=0.9, tau=0.95)
+
+    def test_tau_zero(self):
+        self.check_against_loop(num_steps=20, gamma=0.99, tau=0.)
+
+    def test_gamma_tau_one(self):
+        self.check_against_loop(num_steps=20, gamma=1., tau=1.)
+
+    def test_single_step_rollout(self):
+        self.check_against_loop(num_steps=1, gamma=0.99, tau=1.00)
+
+
+class TestMaskedReturnsAndGAE(unittest.TestCase):
+    """
+    Compares the masked A2C recursion to a plain per environment loop with episodes ending in the
+    middle of the rollout
+    """
+    def test_episode_ends_within_rollout(self):
+        torch.manual_seed(0)
+        num_steps, num_envs = 8, 3
+        rewards = torch.randn(num_steps, num_envs, dtype=torch.float64)
+        values = torch.randn(num_steps, num_envs, dtype=torch.float64)
+        next_value = torch.randn(num_envs, dtype=torch.float64)
+        masks = torch.ones(num_steps, num_envs, dtype=torch.float64)
+        masks[2, 0] = 0  # env 0 ends an episode in the middle of the rollout
+        masks[5, 0] = 0  # and another one later on
+        masks[num_steps - 1, 1] = 0  # env 1 ends one on the last step, so no bootstrap
+        # env 2 runs through the whole rollout
+
+        for gamma, tau in [(0.99, 1.00), (0.9, 0.95), (0.99, 0.)]:
+            returns, advantages = masked_returns_and_gae(rewards, masks, values, next_value,
+                                                         gamma, tau)
+            expected_returns, expected_gae = per_env_loop_returns_and_gae(
+                rewards, masks, values, next_value, gamma, tau)
+            self.assertTrue(torch.allclose(returns, expected_returns))
+            self.assertTrue(torch.allclose(advantages, expected_gae))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@
 Tests related to the ai2thor environment wrapper.
 """
 import random
+import signal
 import threading
 import time
 import unittest
@@ -123,6 +124,20 @@ class TestAI2ThorEnv(unittest.TestCase):
         self.assertTrue(env.scene_id == 'FloorPlan27')
         env.close()
 
+    def test_get_spaces_without_starting_env(self):
+        """
+        Check that the spaces read from the config without starting ai2thor match the spaces of
+        an environment created with the same config
+        """
+        config_dict = {'grayscale': False, 'resolution': [64, 64], 'open_close_interaction': False}
+        observation_space, action_space = AI2ThorEnv.get_spaces(config_dict=config_dict)
+        env = AI2ThorEnv(config_dict=config_dict)
+
+        self.assertEqual(observation_space.shape, env.observation_space.shape)
+        self.assertEqual(observation_space.shape, (3, 64, 64))
+        self.assertEqual(action_space.n, env.action_space.n)
+        env.close()
+
     @staticmethod
     def test_simple_example():
         """
@@ -215,11 +230,29 @@ class TestAI2ThorEnv(unittest.TestCase):
         Good examples of how to multi-thread are below
         """
         thread_count = 1
+        # set once every thread has finished or on SIGINT, so the main thread can block on it
+        # instead of polling each thread with a join timeout
+        done_event = threading.Event()
+        finished_threads = []
+        finished_lock = threading.Lock()
 
         def run(thread_num):
+            """
+            Runs the render options and then marks the thread finished, setting done_event once
+            every thread has finished
+            """
+            try:
+                run_render_options(thread_num)
+            finally:
+                with finished_lock:
+                    finished_threads.append(thread_num)
+                    if len(finished_threads) == thread_count:
+                        done_event.set()
+
+        def run_render_options(thread_num):
             """
             Runs 5 iterations of 10 steps of the environment with the different rendering options
-            :param thread_num: (int) Number of threads to launch
+            :param thread_num: (int) Index of this thread
             """
             env = ai2thor.controller.Controller()
             env.start()
@@ -265,11 +298,17 @@ class TestAI2ThorEnv(unittest.TestCase):
             thread.start()
             time.sleep(1)
 
+        previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: done_event.set())
+        try:
+            done_event.wait()
+        finally:
+            signal.signal(signal.SIGINT, previous_handler)
+        if len(finished_threads) < thread_count:
+            # woken up by SIGINT, the daemon threads are left to die with the process
+            raise KeyboardInterrupt
+
         for thread in threads:
-            # calling join() in a loop/timeout to allow for Python 2.7
-            # to be interrupted with SIGINT
-            while thread.isAlive():
-                thread.join(1)
+            thread.join()
 
         print('done')
 